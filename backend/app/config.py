@@ -12,10 +12,17 @@ class Settings:
     """Centralized configuration loaded once per process."""
 
     base_dir: Path = Path(__file__).resolve().parent.parent
-    model_path: Path = base_dir / "models" / "final_model_big.keras"
+    models_dir: Path = base_dir / "models"
+    model_path: Path = models_dir / "final_model_big.keras"
+    detector_manifest: Path = models_dir / "detectors.json"
     temp_dir: Path = base_dir / "temp"
     log_dir: Path = base_dir / "logs"
     max_file_mb: int = 200
+    inline_image_max_mb: int = int(os.getenv("INLINE_IMAGE_MAX_MB", "20"))
+    temp_store_max_mb: int = int(os.getenv("TEMP_STORE_MAX_MB", "2048"))
+    temp_ttl_seconds: int = int(os.getenv("TEMP_TTL_SECONDS", "3600"))
+    max_stream_buffer_mb: int = int(os.getenv("MAX_STREAM_BUFFER_MB", "16"))
+    frame_results_limit: int = int(os.getenv("FRAME_RESULTS_LIMIT", "16"))
     image_extensions: Set[str] = field(
         default_factory=lambda: {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"}
     )
@@ -26,6 +33,18 @@ class Settings:
     ollama_url: str = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
     api_key: str | None = os.getenv("DEEPFAKE_API_KEY", "local-demo-key")
     ollama_model: str = os.getenv("OLLAMA_MODEL", "llama3:8b")
+    fusion_strategy: str = os.getenv("DETECTOR_FUSION", "weighted_mean")
+    detector_workers: int = int(os.getenv("DETECTOR_WORKERS", "4"))
+    profile_token: str | None = os.getenv("DEEPFAKE_PROFILE_TOKEN")
+    trace_sample_rate: float = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+    stub_model: bool = os.getenv("DEEPFAKE_STUB_MODEL", "0").lower() in ("1", "true", "yes")
+    stub_model_latency_ms: float = float(os.getenv("DEEPFAKE_STUB_LATENCY_MS", "0"))
+    video_segment_min_seconds: float = float(os.getenv("VIDEO_SEGMENT_MIN_SECONDS", "120"))
+    max_video_frames: int = 8
+    # More workers than sampled frames would each spawn and open the file for nothing.
+    video_decode_workers: int = int(
+        os.getenv("VIDEO_DECODE_WORKERS", str(min(os.cpu_count() or 2, max_video_frames)))
+    )
 
     def __post_init__(self) -> None:
         object.__setattr__(self, "allowed_extensions", self.image_extensions | self.video_extensions)
@@ -34,7 +53,9 @@ class Settings:
 
 
 settings = Settings()
+MODELS_DIR = settings.models_dir
 MODEL_PATH = settings.model_path
+DETECTOR_MANIFEST = settings.detector_manifest
 TEMP_DIR = settings.temp_dir
 LOG_DIR = settings.log_dir
 MAX_FILE_MB = settings.max_file_mb
@@ -42,6 +63,20 @@ IMAGE_EXTENSIONS = settings.image_extensions
 VIDEO_EXTENSIONS = settings.video_extensions
 ALLOWED_EXTENSIONS = settings.allowed_extensions
 MAX_FILE_BYTES = MAX_FILE_MB * 1024 * 1024
+INLINE_IMAGE_MAX_BYTES = settings.inline_image_max_mb * 1024 * 1024
+TEMP_STORE_MAX_BYTES = settings.temp_store_max_mb * 1024 * 1024
+TEMP_TTL_SECONDS = settings.temp_ttl_seconds
+MAX_STREAM_BUFFER_BYTES = settings.max_stream_buffer_mb * 1024 * 1024
+FRAME_RESULTS_LIMIT = settings.frame_results_limit
 OLLAMA_URL = settings.ollama_url
 API_KEY = settings.api_key
 OLLAMA_MODEL = settings.ollama_model
+FUSION_STRATEGY = settings.fusion_strategy
+DETECTOR_WORKERS = settings.detector_workers
+PROFILE_TOKEN = settings.profile_token
+TRACE_SAMPLE_RATE = settings.trace_sample_rate
+STUB_MODEL = settings.stub_model
+STUB_MODEL_LATENCY_MS = settings.stub_model_latency_ms
+VIDEO_SEGMENT_MIN_SECONDS = settings.video_segment_min_seconds
+MAX_VIDEO_FRAMES = settings.max_video_frames
+VIDEO_DECODE_WORKERS = settings.video_decode_workers
@@ -1,62 +1,22 @@
 from __future__ import annotations
 
-import shutil
-import stat
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from threading import Lock
-from typing import Iterable, Optional
+from typing import Iterable, Optional, Sequence
 
 import cv2
 import numpy as np
-import tensorflow as tf
 
-from .config import IMAGE_EXTENSIONS, MODEL_PATH, VIDEO_EXTENSIONS
-from .preprocessing import IMAGE_SIZE, preprocess_bytes, preprocess_frame, preprocess_image
+from .config import IMAGE_EXTENSIONS, MAX_VIDEO_FRAMES, VIDEO_EXTENSIONS, VIDEO_SEGMENT_MIN_SECONDS
+from .model_registry import registry
+from .preprocessing import decode_bytes_to_rgb
+from .tracing import span
+from .video_decoding import extract_frames_segmented
 
-MODEL_LOCK = Lock()
-_MODEL: tf.keras.Model | None = None
-MAX_VIDEO_FRAMES = 8
 
-
-def _load_model() -> tf.keras.Model:
-    global _MODEL
-    with MODEL_LOCK:
-        if _MODEL is not None:
-            return _MODEL
-
-        if not MODEL_PATH.exists():
-            raise FileNotFoundError(
-                f"Model file not found at {MODEL_PATH}. Ensure 'final_model_big.keras' is in 'backend/models/'."
-            )
-
-        try:
-            _MODEL = tf.keras.models.load_model(MODEL_PATH, safe_mode=False)
-        except PermissionError:
-            runtime_dir = MODEL_PATH.parent / "runtime"
-            runtime_dir.mkdir(parents=True, exist_ok=True)
-            temp_path = runtime_dir / f"{MODEL_PATH.stem}_rt.keras"
-            shutil.copy2(MODEL_PATH, temp_path)
-            temp_path.chmod(stat.S_IREAD | stat.S_IWRITE)
-            _MODEL = tf.keras.models.load_model(temp_path, safe_mode=False)
-            temp_path.unlink(missing_ok=True)
-        return _MODEL
-
-
-def _predict_fake_probability(batch: np.ndarray) -> float:
-    """Return probability that the media is synthetic (fake)."""
-    model = _load_model()
-    raw_prediction = model.predict(batch, verbose=0)
-    array = np.atleast_1d(np.squeeze(raw_prediction).astype(np.float32))
-    if array.size == 1:
-        value = float(array.item())
-        if not (0.0 <= value <= 1.0):
-            value = 1.0 / (1.0 + np.exp(-value))
-        return value
-    logits = array - np.max(array)
-    exp = np.exp(logits)
-    softmax = exp / np.sum(exp)
-    fake_prob = float(softmax[0])
-    return fake_prob
+def _score_frames(frames_rgb: Sequence[np.ndarray]) -> dict:
+    """Run the detector ensemble once over all frames sharing decoded RGB input."""
+    return registry.score(frames_rgb)
 
 
 def _artifact_hints(probability: float, media_type: str) -> list[str]:
@@ -80,6 +40,25 @@ def _extract_video_frames(path: Path) -> Iterable[np.ndarray]:
         return []
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or MAX_VIDEO_FRAMES
     step = max(1, total_frames // MAX_VIDEO_FRAMES)
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    duration_seconds = total_frames / fps if fps > 0 else 0.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if duration_seconds >= VIDEO_SEGMENT_MIN_SECONDS and width and height:
+        # Long videos: decode time segments in parallel processes via shared memory.
+        cap.release()
+        indices = [index * step for index in range(MAX_VIDEO_FRAMES) if index * step < total_frames]
+        try:
+            frames = extract_frames_segmented(path, indices, width, height)
+            if len(frames) == len(indices):
+                return frames
+        except (OSError, BrokenProcessPool, cv2.error):
+            pass
+        # Missing frames (e.g. rotated streams whose decoded shape differs from the
+        # container's reported size), decoder errors or pool failures: use the sequential reader.
+        cap = cv2.VideoCapture(str(path))
+
     frames = []
     index = 0
     while len(frames) < MAX_VIDEO_FRAMES:
@@ -93,8 +72,9 @@ def _extract_video_frames(path: Path) -> Iterable[np.ndarray]:
     return frames
 
 
-def _build_response(probability: float, context: Optional[str], media_type: str) -> dict:
-    probability = max(0.0, min(1.0, probability))
+def _build_response(scores: dict, context: Optional[str], media_type: str) -> dict:
+    probability = max(0.0, min(1.0, scores["probability"]))
+    models = scores["models"]
     label = "fake" if probability >= 0.5 else "real"
     confidence = probability if label == "fake" else 1 - probability
     return {
@@ -102,17 +82,19 @@ def _build_response(probability: float, context: Optional[str], media_type: str)
         "confidence": round(confidence, 4),
         "probabilities": {"fake": round(probability, 4), "real": round(1 - probability, 4)},
         "context": context,
-        "model": MODEL_PATH.name,
-        "image_size": IMAGE_SIZE,
+        "model": "+".join(model["name"] for model in models),
+        "models": models,
+        "fusion": registry.fusion,
+        "image_size": registry.primary_input_size(),
         "artifacts": _artifact_hints(probability, media_type),
     }
 
 
 def analyze_image_bytes(raw_bytes: bytes, context: Optional[str] = None) -> dict:
     """Analyze raw image bytes without touching disk (used by browser extensions)."""
-    batch = preprocess_bytes(raw_bytes)
-    probability = _predict_fake_probability(batch)
-    return _build_response(probability, context, "image")
+    with span("decode", bytes=len(raw_bytes)):
+        rgb = decode_bytes_to_rgb(raw_bytes)
+    return _build_response(_score_frames([rgb]), context, "image")
 
 
 def analyze_media(path: str, context: Optional[str] = None, media_type: str = "image") -> dict:
@@ -130,17 +112,19 @@ def analyze_media(path: str, context: Optional[str] = None, media_type: str = "i
         raise ValueError("Unsupported video extension")
 
     if media_type == "video":
-        frames = _extract_video_frames(media_path)
-        if not frames:
-            raise ValueError("Unable to decode video frames.")
-        probabilities = []
-        for frame in frames:
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            batch = preprocess_frame(frame_rgb)
-            probabilities.append(_predict_fake_probability(batch))
-        probability = float(sum(probabilities) / len(probabilities))
+        with span("decode", media_type="video") as stage:
+            frames = _extract_video_frames(media_path)
+            if not frames:
+                raise ValueError("Unable to decode video frames.")
+            frames_rgb = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+            stage["frames"] = len(frames_rgb)
+            stage["bytes"] = sum(frame.nbytes for frame in frames_rgb)
+        scores = _score_frames(frames_rgb)
     else:
-        batch = preprocess_image(media_path)
-        probability = _predict_fake_probability(batch)
+        with span("decode", media_type="image") as stage:
+            raw_bytes = media_path.read_bytes()
+            stage["bytes"] = len(raw_bytes)
+            rgb = decode_bytes_to_rgb(raw_bytes)
+        scores = _score_frames([rgb])
 
-    return _build_response(probability, context, media_type)
+    return _build_response(scores, context, media_type)
@@ -2,19 +2,37 @@ from __future__ import annotations
 
 import base64
 import binascii
+import hashlib
 from datetime import datetime
 from threading import Lock
+from typing import Awaitable
 
 from fastapi import FastAPI, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 
-from .config import API_KEY, MODEL_PATH
+from .config import API_KEY, FRAME_RESULTS_LIMIT, MAX_STREAM_BUFFER_BYTES
 from .inference import analyze_image_bytes, analyze_media
+from .model_registry import registry
 from .ollama_client import generate_threat_analysis
+from .responses import NotAcceptableError, ResponseOptions, render_response
 from .security_mapping import get_threat_definitions
-from .utils import log_analysis_event, save_temp_file, temp_storage_ready
+from .singleflight import SingleFlight
+from .streaming import FrameAggregate, FrameStreamParser, PayloadTooLargeError
+from .tracing import controller as tracing_controller
+from .tracing import finish_request_trace, is_privileged, run_profiled, span, start_request_trace
+from .utils import (
+    SavedFile,
+    TempStorageFullError,
+    UploadInfo,
+    inspect_upload,
+    log_analysis_event,
+    release_saved_file,
+    save_temp_file,
+    temp_store,
+)
 
 
 class StatsTracker:
@@ -49,6 +67,10 @@ class StatsTracker:
 
 app = FastAPI(title="Deepfake Detection Backend", version="0.2.0")
 stats_tracker = StatsTracker()
+# Concurrent identical uploads/frames share one in-flight analysis.
+analysis_flights = SingleFlight()
+frame_flights = SingleFlight()
+FRAME_MEMO_LIMIT = 256
 
 app.add_middleware(
     CORSMiddleware,
@@ -63,6 +85,12 @@ class FrameBatch(BaseModel):
     context: str | None = None
 
 
+class ProfilingConfig(BaseModel):
+    sample_rate: float | None = None
+    arm: int | None = None
+    mode: str | None = None
+
+
 @app.get("/health")
 async def health_check() -> dict:
     """Simple liveness check."""
@@ -70,12 +98,22 @@ async def health_check() -> dict:
 
 
 @app.get("/readiness")
-async def readiness_check() -> dict:
-    """Report readiness indicators for the local stack."""
+def readiness_check() -> dict:
+    """Report readiness indicators for the local stack.
+
+    Sync so FastAPI runs it in the threadpool: the temp-store scan and manifest read hit disk.
+    """
+    try:
+        detectors, detector_error = registry.status(), None
+    except ValueError as exc:  # Malformed detectors.json.
+        detectors, detector_error = [], str(exc)
     readiness = {
         "api": "ok",
-        "model_loaded": MODEL_PATH.exists(),
-        "temp_storage": "ok" if temp_storage_ready() else "unavailable",
+        "model_loaded": bool(detectors) and all(detector["file_present"] for detector in detectors),
+        "detectors": detectors,
+        "detector_error": detector_error,
+        "fusion": registry.fusion,
+        "temp_storage": temp_store.usage(),
         "ollama_available": False,  # TODO: ping OLLAMA_URL once integrated.
     }
     return readiness
@@ -93,27 +131,88 @@ async def threat_definitions() -> list[dict[str, str]]:
     return get_threat_definitions()
 
 
+@app.post("/models/reload", response_model=None)
+async def reload_models(request: Request, name: str | None = None) -> JSONResponse:
+    """Hot-reload one or all detectors; in-flight requests finish on the old weights."""
+    if API_KEY and request.headers.get("x-api-key") != API_KEY:
+        return JSONResponse(status_code=401, content={"error": "invalid_api_key"})
+    try:
+        detectors = await run_in_threadpool(registry.reload, name)
+    except (ValueError, FileNotFoundError) as exc:
+        return JSONResponse(status_code=400, content={"error": str(exc)})
+    return JSONResponse(content={"detectors": detectors, "fusion": registry.fusion})
+
+
+@app.get("/admin/profiling")
+async def profiling_state(request: Request) -> JSONResponse:
+    """Report trace sampling/arming state and recent trace ids."""
+    if not is_privileged(request):
+        return JSONResponse(status_code=403, content={"error": "profiling_not_permitted"})
+    return JSONResponse(content=tracing_controller.state())
+
+
+@app.post("/admin/profiling")
+async def configure_profiling(config: ProfilingConfig, request: Request) -> JSONResponse:
+    """Set the trace sample rate and/or arm profiling for the next ``arm`` analyze requests."""
+    if not is_privileged(request):
+        return JSONResponse(status_code=403, content={"error": "profiling_not_permitted"})
+    try:
+        state = tracing_controller.configure(config.sample_rate, config.arm, config.mode)
+    except ValueError as exc:
+        return JSONResponse(status_code=400, content={"error": str(exc)})
+    return JSONResponse(content=state)
+
+
+@app.get("/admin/traces/{trace_id}")
+async def get_trace(trace_id: str, request: Request) -> JSONResponse:
+    """Return a recently finished trace (older ones remain in ``logs/traces.log``)."""
+    if not is_privileged(request):
+        return JSONResponse(status_code=403, content={"error": "profiling_not_permitted"})
+    trace = tracing_controller.find(trace_id)
+    if trace is None:
+        return JSONResponse(status_code=404, content={"error": "trace_not_found"})
+    return JSONResponse(content=trace)
+
+
 @app.post("/analyze", response_model=None)
-async def analyze_endpoint(request: Request) -> JSONResponse:
-    """Analyze uploaded media or JSON frames."""
+async def analyze_endpoint(request: Request) -> Response:
+    """Analyze uploaded media or JSON frames.
+
+    ``?profile=compact`` (or ``?compact=1``) drops duplicated LLM fields and per-frame
+    results, ``?fields=label,llm.final_verdict`` projects dotted paths, and
+    ``Accept: application/msgpack`` selects MessagePack encoding. Send
+    ``X-Profile: trace|cprofile|pyinstrument|tf`` with ``X-Profile-Token`` to trace it.
+    """
+    trace = response = None
+    try:
+        trace = start_request_trace(request)
+        response = await _analyze(request)
+        return response
+    finally:
+        finish_request_trace(trace, response)
+
+
+async def _analyze(request: Request) -> Response:
     content_type = (request.headers.get("content-type") or "").lower()
 
     try:
+        options = ResponseOptions.from_request(request)
         if "application/json" in content_type:
-            return await _handle_json_analysis(request)
+            return render_response(await _handle_json_analysis(request), options)
 
         x_api_key = request.headers.get("x-api-key")
         if API_KEY and x_api_key != API_KEY:
             return JSONResponse(status_code=401, content={"error": "invalid_api_key"})
 
         if "multipart/form-data" in content_type:
-            form = await request.form()
+            with span("ingest", step="form"):
+                form = await request.form()
             upload = form.get("file")
             if upload is None:
                 raise HTTPException(status_code=400, detail="Missing 'file' in multipart payload.")
             context = form.get("context")
             media_type = form.get("media_type")
-            return _handle_file_analysis(upload, context, media_type)
+            return render_response(await _handle_file_analysis(upload, context, media_type), options)
 
         raise HTTPException(
             status_code=415,
@@ -121,6 +220,12 @@ async def analyze_endpoint(request: Request) -> JSONResponse:
         )
     except HTTPException:
         raise
+    except PayloadTooLargeError as exc:
+        return JSONResponse(status_code=413, content={"error": str(exc)})
+    except NotAcceptableError as exc:
+        return JSONResponse(status_code=406, content={"error": str(exc)})
+    except TempStorageFullError as exc:
+        return JSONResponse(status_code=503, content={"error": "temp_storage_full", "detail": str(exc)})
     except (ValueError, FileNotFoundError) as exc:
         return JSONResponse(status_code=400, content={"error": str(exc)})
     except Exception as exc:  # pylint: disable=broad-except
@@ -133,129 +238,225 @@ async def analyze_endpoint(request: Request) -> JSONResponse:
         )
 
 
-@app.post("/analyze/frames")
-async def analyze_frames(batch: FrameBatch) -> JSONResponse:
-    """Accept frames (e.g., from a Chrome extension) and aggregate predictions."""
-    result = _process_frame_batch(batch.frames, batch.context)
-    return JSONResponse(content=result)
+@app.post(
+    "/analyze/frames",
+    response_model=None,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": FrameBatch.model_json_schema()}},
+        }
+    },
+)
+async def analyze_frames(request: Request) -> Response:
+    """Accept frames (e.g., from a Chrome extension) and aggregate predictions.
 
+    The body is parsed incrementally, so only one frame is held in memory at a time.
+    Supports the same ``profile``/``fields``/Accept/``X-Profile`` handling as ``/analyze``.
+    """
+    trace = response = None
+    try:
+        trace = start_request_trace(request)
+        try:
+            options = ResponseOptions.from_request(request)
+            result = await _stream_frame_batch(request)
+        except PayloadTooLargeError as exc:
+            response = JSONResponse(status_code=413, content={"error": str(exc)})
+        except NotAcceptableError as exc:
+            response = JSONResponse(status_code=406, content={"error": str(exc)})
+        except ValueError as exc:
+            response = JSONResponse(status_code=400, content={"error": str(exc)})
+        else:
+            response = render_response(result, options)
+        return response
+    finally:
+        finish_request_trace(trace, response)
+
+
+async def _handle_file_analysis(upload: UploadFile, context: str | None, media_type: str | None) -> dict:
+    with span("ingest", step="hash") as stage:
+        info = await run_in_threadpool(inspect_upload, upload)
+        stage["bytes"] = info.size_bytes
+    requested_media_type = (media_type or info.media_type or "image").lower()
+
+    def start() -> Awaitable[dict]:
+        # Only the leader copies the upload; coalesced callers never touch the temp store.
+        return run_in_threadpool(
+            run_profiled, _ingest_and_analyze, upload, info, requested_media_type, context, upload.filename
+        )
+
+    key = ("file", info.sha256, requested_media_type, context)
+    result = await analysis_flights.do(key, start)
+    if result["llm"].get("filename") != upload.filename:
+        # Coalesced callers share the leader's result; only the filename is theirs.
+        result = {**result, "llm": {**result["llm"], "filename": upload.filename}}
+    # Every caller is its own analysis for stats and the audit trail.
+    await run_in_threadpool(_record_analysis, result)
+    return result
+
+
+def _record_analysis(result: dict) -> None:
+    stats_tracker.record(result["label"])
+    with span("audit_log"):
+        log_analysis_event(
+            file_hash=result["file_hash"],
+            label=result["label"],
+            confidence=result["confidence"],
+            context=result["context"],
+            attack_vectors=result["llm"].get("attack_vectors", []),
+        )
 
-def _handle_file_analysis(upload: UploadFile, context: str | None, media_type: str | None) -> JSONResponse:
-    saved_file = save_temp_file(upload)
-    requested_media_type = (media_type or saved_file.media_type or "image").lower()
-    inference_result = analyze_media(str(saved_file.path), context, requested_media_type)
+
+def _ingest_and_analyze(
+    upload: UploadFile, info: UploadInfo, requested_media_type: str, context: str | None, filename: str | None
+) -> dict:
+    # Save, analyze and release on one worker thread so a cancelled flight cannot strand the copy.
+    with span("ingest", step="upload") as stage:
+        saved_file = save_temp_file(upload, info)
+        stage["in_memory"] = saved_file.data is not None
+    try:
+        return _analyze_saved_file(saved_file, requested_media_type, context, filename)
+    finally:
+        release_saved_file(saved_file)
+
+
+def _analyze_saved_file(
+    saved_file: SavedFile, requested_media_type: str, context: str | None, filename: str | None
+) -> dict:
+    if saved_file.data is not None:
+        if requested_media_type == "video":
+            raise ValueError("Unsupported video extension")
+        inference_result = analyze_image_bytes(saved_file.data, context)
+    else:
+        inference_result = analyze_media(str(saved_file.path), context, requested_media_type)
     probabilities = inference_result.get("probabilities") or {}
     analysis_payload = {
         "input_type": requested_media_type,
-        "models": [
-            {
-                "name": inference_result.get("model", MODEL_PATH.name),
-                "fake_prob": probabilities.get("fake"),
-                "real_prob": probabilities.get("real"),
-                "confidence": inference_result.get("confidence"),
-            }
-        ],
+        "models": inference_result.get("models") or [],
+        "fusion": inference_result.get("fusion"),
+        "fused": {
+            "fake_prob": probabilities.get("fake"),
+            "real_prob": probabilities.get("real"),
+            "confidence": inference_result.get("confidence"),
+        },
         "detected_artifacts": inference_result.get("artifacts") or [],
         "context": context,
         "sha256": saved_file.sha256,
         "image_size": inference_result.get("image_size"),
     }
-    llm_payload = generate_threat_analysis(
-        label=inference_result.get("label"),
-        confidence=inference_result.get("confidence"),
-        context=context,
-        filename=upload.filename,
-        analysis_data=analysis_payload,
-    )
-
-    stats_tracker.record(inference_result.get("label", "unknown"))
-    log_analysis_event(
-        file_hash=saved_file.sha256,
-        label=inference_result.get("label", "unknown"),
-        confidence=inference_result.get("confidence", 0.0),
-        context=context,
-        attack_vectors=llm_payload.get("attack_vectors", []),
-    )
-
-    return JSONResponse(
-        content={
-            "label": inference_result.get("label", "unknown"),
-            "confidence": inference_result.get("confidence", 0.0),
-            "probabilities": inference_result.get("probabilities"),
-            "context": context,
-            "media_type": requested_media_type,
-            "model": inference_result.get("model"),
-            "file_hash": saved_file.sha256,
-            "artifacts": inference_result.get("artifacts", []),
-            "analysis_data": analysis_payload,
-            "image_size": inference_result.get("image_size"),
-            "llm": llm_payload,
-        }
-    )
+    with span("llm"):
+        llm_payload = generate_threat_analysis(
+            label=inference_result.get("label"),
+            confidence=inference_result.get("confidence"),
+            context=context,
+            filename=filename,
+            analysis_data=analysis_payload,
+        )
+
+    return {
+        "label": inference_result.get("label", "unknown"),
+        "confidence": inference_result.get("confidence", 0.0),
+        "probabilities": inference_result.get("probabilities"),
+        "context": context,
+        "media_type": requested_media_type,
+        "model": inference_result.get("model"),
+        "file_hash": saved_file.sha256,
+        "artifacts": inference_result.get("artifacts", []),
+        "analysis_data": analysis_payload,
+        "image_size": inference_result.get("image_size"),
+        "llm": llm_payload,
+    }
 
 
-async def _handle_json_analysis(request: Request) -> JSONResponse:
+async def _handle_json_analysis(request: Request) -> dict:
     """Handle Chrome extension style JSON payloads."""
-    payload = await request.json()
-    payload_context = payload.get("context")
-    frames = payload.get("frames")
-    single_frame = payload.get("frame") or payload.get("image_base64")
-    if not frames and single_frame:
-        frames = [single_frame]
-    if frames:
-        result = _process_frame_batch(frames, payload_context)
-        return JSONResponse(content=result)
+    return await _stream_frame_batch(request)
 
-    raise HTTPException(status_code=400, detail="JSON payload must include 'frames' or 'frame' base64 data.")
 
+def _decode_frame(encoded: bytes | str, index: int) -> bytes:
+    try:
+        with span("ingest", step="base64", frame=index, bytes=len(encoded)):
+            return base64.b64decode(encoded)
+    except binascii.Error as exc:  # pragma: no cover - defensive guard
+        raise HTTPException(status_code=400, detail=f"Invalid base64 frame at index {index}") from exc
 
-def _process_frame_batch(encoded_frames: list[str], context: str | None) -> dict:
-    if not encoded_frames:
-        raise HTTPException(status_code=400, detail="No frames provided.")
 
-    frame_results = []
-    for index, encoded in enumerate(encoded_frames):
-        try:
-            raw_bytes = base64.b64decode(encoded)
-        except binascii.Error as exc:  # pragma: no cover - defensive guard
-            raise HTTPException(status_code=400, detail=f"Invalid base64 frame at index {index}") from exc
-        result = analyze_image_bytes(raw_bytes, context)
-        frame_results.append(result)
-
-    avg_fake = sum(result["probabilities"]["fake"] for result in frame_results) / len(frame_results)
-    avg_fake = max(0.0, min(1.0, avg_fake))
+async def _stream_frame_batch(request: Request) -> dict:
+    """Decode and score frames one at a time as they arrive off the request body."""
+    parser = FrameStreamParser(request.stream(), MAX_STREAM_BUFFER_BYTES)
+    aggregate = FrameAggregate(top_k=FRAME_RESULTS_LIMIT)
+    context: str | None = None
+    single_frames: dict[str, str] = {}
+    memo: dict[str, dict] = {}
+
+    async for kind, value in parser.events():
+        if kind == "frame":
+            raw_bytes = _decode_frame(value, aggregate.count)
+            aggregate.add(await _score_frame(raw_bytes, memo))
+            continue
+        key, field_value = value
+        # Mirror FrameBatch's types here, since the body is never validated as a whole.
+        if key == "context":
+            if field_value is not None and not isinstance(field_value, str):
+                raise ValueError("'context' must be a string or null.")
+            context = field_value
+        elif key == "frames" and field_value is not None:
+            raise ValueError("'frames' must be an array of base64 strings.")
+        elif key in ("frame", "image_base64") and field_value:
+            if not isinstance(field_value, str):
+                raise ValueError(f"'{key}' must be a base64 string.")
+            single_frames[key] = field_value
+
+    single_frame = single_frames.get("frame") or single_frames.get("image_base64")
+    if not aggregate.count and single_frame:
+        aggregate.add(await _score_frame(_decode_frame(single_frame, 0), memo))
+    if not aggregate.count:
+        raise HTTPException(status_code=400, detail="JSON payload must include 'frames' or 'frame' base64 data.")
+
+    return await run_in_threadpool(run_profiled, _finalize_frame_batch, aggregate, context)
+
+
+async def _score_frame(raw_bytes: bytes, memo: dict[str, dict]) -> dict:
+    """Score a decoded frame, reusing results for repeats in this batch or in flight elsewhere."""
+    digest = hashlib.sha256(raw_bytes).hexdigest()
+    result = memo.get(digest)
+    if result is None:
+        result = await frame_flights.do(
+            ("frame", digest), lambda: run_in_threadpool(run_profiled, analyze_image_bytes, raw_bytes)
+        )
+        if len(memo) < FRAME_MEMO_LIMIT:
+            memo[digest] = result
+    return result
+
+
+def _finalize_frame_batch(aggregate: FrameAggregate, context: str | None) -> dict:
+    avg_fake = aggregate.fake_probability
     label = "fake" if avg_fake >= 0.5 else "real"
     confidence = avg_fake if label == "fake" else 1 - avg_fake
     probability_payload = {"fake": round(avg_fake, 4), "real": round(1 - avg_fake, 4)}
 
-    artifact_set: list[str] = []
-    for result in frame_results:
-        for artifact in result.get("artifacts", []):
-            if artifact not in artifact_set:
-                artifact_set.append(artifact)
-
     analysis_payload = {
         "input_type": "video_stream",
-        "frames_sampled": len(frame_results),
-        "models": [
-            {
-                "name": frame_results[0]["model"] if frame_results else MODEL_PATH.name,
-                "fake_prob": probability_payload["fake"],
-                "real_prob": probability_payload["real"],
-                "confidence": round(confidence, 4),
-            }
-        ],
-        "detected_artifacts": artifact_set,
+        "frames_sampled": aggregate.count,
+        "models": aggregate.model_results(),
+        "fusion": aggregate.fusion,
+        "fused": {
+            "fake_prob": probability_payload["fake"],
+            "real_prob": probability_payload["real"],
+            "confidence": round(confidence, 4),
+        },
+        "detected_artifacts": aggregate.artifacts,
         "context": context,
     }
 
-    llm_payload = generate_threat_analysis(
-        label=label,
-        confidence=confidence,
-        context=context,
-        filename=None,
-        analysis_data=analysis_payload,
-    )
+    with span("llm"):
+        llm_payload = generate_threat_analysis(
+            label=label,
+            confidence=confidence,
+            context=context,
+            filename=None,
+            analysis_data=analysis_payload,
+        )
 
     stats_tracker.record(label)
 
@@ -265,9 +466,9 @@ def _process_frame_batch(encoded_frames: list[str], context: str | None) -> dict
         "probabilities": probability_payload,
         "context": context,
         "media_type": "video_stream",
-        "model": frame_results[0]["model"] if frame_results else MODEL_PATH.name,
+        "model": aggregate.model,
         "analysis_data": analysis_payload,
-        "frames_analyzed": len(frame_results),
-        "frame_results": frame_results,
+        "frames_analyzed": aggregate.count,
+        "frame_results": aggregate.top_frames(),
         "llm": llm_payload,
     }
@@ -0,0 +1,331 @@
+"""Registry of deepfake detectors loaded from ``backend/models/``.
+
+Detectors are declared in ``models/detectors.json``::
+
+    {
+      "fusion": "weighted_mean",
+      "detectors": [
+        {"name": "effnet_v2", "file": "final_model_big.keras",
+         "input_size": [256, 256], "normalization": "efficientnet_v2", "weight": 1.0}
+      ]
+    }
+
+Without a manifest only ``MODEL_PATH`` is served, with the EfficientNetV2 defaults,
+which keeps the single-model setup working as-is; other checkpoints lying in the
+models directory are ignored until they are declared.
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import shutil
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from .config import (
+    DETECTOR_MANIFEST,
+    DETECTOR_WORKERS,
+    FUSION_STRATEGY,
+    MODEL_PATH,
+    MODELS_DIR,
+    STUB_MODEL,
+    STUB_MODEL_LATENCY_MS,
+)
+from .preprocessing import IMAGE_SIZE, NORMALIZERS, normalize, resize_rgb
+from .tracing import profiling_active, span
+
+FUSION_STRATEGIES = ("weighted_mean", "max")
+
+
+@dataclass(frozen=True)
+class DetectorSpec:
+    """Static description of a detector and the input it expects."""
+
+    name: str
+    path: Path
+    input_size: Tuple[int, int] = IMAGE_SIZE
+    normalization: str = "efficientnet_v2"
+    weight: float = 1.0
+
+
+@dataclass(frozen=True)
+class LoadedDetector:
+    """A detector spec paired with its loaded Keras model."""
+
+    spec: DetectorSpec
+    model: Any
+    mtime: float
+    loaded_at: float
+
+
+def _load_keras_model(path: Path) -> tf.keras.Model:
+    if not path.exists():
+        raise FileNotFoundError(
+            f"Model file not found at {path}. Ensure '{path.name}' is in 'backend/models/'."
+        )
+    try:
+        return tf.keras.models.load_model(path, safe_mode=False)
+    except PermissionError:
+        runtime_dir = path.parent / "runtime"
+        runtime_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = runtime_dir / f"{path.stem}_rt.keras"
+        shutil.copy2(path, temp_path)
+        temp_path.chmod(stat.S_IREAD | stat.S_IWRITE)
+        model = tf.keras.models.load_model(temp_path, safe_mode=False)
+        temp_path.unlink(missing_ok=True)
+        return model
+
+
+class StubDetector:
+    """Deterministic stand-in for a Keras model, used for load tests without weights.
+
+    Scores each input by its mean pixel intensity so identical inputs agree.
+    """
+
+    def __init__(self, latency_ms: float = 0.0) -> None:
+        self._latency_s = latency_ms / 1000
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        if self._latency_s:
+            time.sleep(self._latency_s)
+        means = batch.reshape(len(batch), -1).mean(axis=1, keepdims=True)
+        return np.clip(means / 255.0, 0.0, 1.0)
+
+
+def _load_detector(spec: DetectorSpec) -> LoadedDetector:
+    model = StubDetector(STUB_MODEL_LATENCY_MS) if STUB_MODEL else _load_keras_model(spec.path)
+    mtime = spec.path.stat().st_mtime if spec.path.exists() else 0.0
+    return LoadedDetector(spec=spec, model=model, mtime=mtime, loaded_at=time.time())
+
+
+def _validate_fusion(fusion: str) -> str:
+    if fusion not in FUSION_STRATEGIES:
+        raise ValueError(f"Unknown fusion strategy '{fusion}'. Supported: {FUSION_STRATEGIES}")
+    return fusion
+
+
+def _fake_probabilities(raw_prediction: Any, count: int) -> np.ndarray:
+    """Return one fake probability per input row from raw model output."""
+    array = np.asarray(raw_prediction, dtype=np.float32).reshape(count, -1)
+    if array.shape[1] == 1:
+        values = array[:, 0]
+        outside = (values < 0.0) | (values > 1.0)
+        return np.where(outside, 1.0 / (1.0 + np.exp(-values)), values)
+    logits = array - np.max(array, axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp[:, 0] / np.sum(exp, axis=1)
+
+
+class ModelRegistry:
+    """Loads detectors lazily, runs them concurrently and fuses their verdicts."""
+
+    def __init__(
+        self,
+        models_dir: Path,
+        manifest_path: Path,
+        default_model_path: Path,
+        fusion: str = "weighted_mean",
+        workers: int = 4,
+    ) -> None:
+        self._models_dir = models_dir
+        self._manifest_path = manifest_path
+        self._default_model_path = default_model_path
+        self._fusion = _validate_fusion(fusion)
+        self._lock = Lock()
+        self._reload_lock = Lock()
+        self._load_locks: Dict[str, Lock] = {}
+        self._specs: Optional[List[DetectorSpec]] = None
+        self._detectors: Dict[str, LoadedDetector] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="detector")
+
+    @property
+    def fusion(self) -> str:
+        return self._fusion
+
+    def _read_manifest(self) -> Tuple[List[DetectorSpec], str]:
+        if not self._manifest_path.exists():
+            path = self._default_model_path
+            return [DetectorSpec(name=path.name, path=path)], FUSION_STRATEGY
+
+        manifest = json.loads(self._manifest_path.read_text(encoding="utf-8"))
+        if not isinstance(manifest, dict) or not isinstance(manifest.get("detectors", []), list):
+            raise ValueError(f"Detector manifest {self._manifest_path} must be an object with a 'detectors' list.")
+        specs = []
+        for index, entry in enumerate(manifest.get("detectors", [])):
+            try:
+                path = self._models_dir / entry["file"]
+                width, height = entry.get("input_size", IMAGE_SIZE)
+                if entry.get("normalization", "efficientnet_v2") not in NORMALIZERS:
+                    raise ValueError(f"unknown normalization, supported: {sorted(NORMALIZERS)}")
+                specs.append(
+                    DetectorSpec(
+                        name=entry.get("name", path.name),
+                        path=path,
+                        input_size=(int(width), int(height)),
+                        normalization=entry.get("normalization", "efficientnet_v2"),
+                        weight=float(entry.get("weight", 1.0)),
+                    )
+                )
+            except (KeyError, TypeError, ValueError, AttributeError) as exc:
+                raise ValueError(
+                    f"Malformed detector #{index} in {self._manifest_path}: expected an object with a "
+                    f"'file' name, optional [width, height] 'input_size' and numeric 'weight' ({exc!r})."
+                ) from exc
+        if not specs:
+            raise ValueError(f"Detector manifest {self._manifest_path} declares no detectors.")
+        return specs, _validate_fusion(manifest.get("fusion", FUSION_STRATEGY))
+
+    def specs(self) -> List[DetectorSpec]:
+        with self._lock:
+            if self._specs is None:
+                self._specs, self._fusion = self._read_manifest()
+            return list(self._specs)
+
+    def _cached(self, spec: DetectorSpec) -> Optional[LoadedDetector]:
+        with self._lock:
+            detector = self._detectors.get(spec.name)
+            return detector if detector is not None and detector.spec == spec else None
+
+    def _get(self, spec: DetectorSpec) -> LoadedDetector:
+        detector = self._cached(spec)
+        if detector is not None:
+            return detector
+        with self._lock:
+            load_lock = self._load_locks.setdefault(spec.name, Lock())
+        # Load outside the registry lock so status()/specs() never wait on Keras.
+        with load_lock:
+            detector = self._cached(spec)
+            if detector is not None:
+                return detector
+            detector = _load_detector(spec)
+            with self._lock:
+                self._detectors[spec.name] = detector
+            return detector
+
+    def reload(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Reload one or all detectors without blocking in-flight predictions.
+
+        New models are loaded outside the registry lock and swapped in atomically;
+        requests that already hold the previous model finish against it.
+        """
+        with self._reload_lock:
+            specs, fusion = self._read_manifest()
+            if name is not None and name not in {spec.name for spec in specs}:
+                raise ValueError(f"Unknown detector '{name}'.")
+            fresh: Dict[str, LoadedDetector] = {}
+            for spec in specs:
+                if name is not None and spec.name != name:
+                    continue
+                fresh[spec.name] = _load_detector(spec)
+            with self._lock:
+                self._specs = specs
+                self._fusion = fusion
+                active = {spec.name for spec in specs}
+                self._detectors = {
+                    key: value for key, value in self._detectors.items() if key in active
+                }
+                self._detectors.update(fresh)
+        return self.status()
+
+    def status(self) -> List[Dict[str, Any]]:
+        specs = self.specs()
+        with self._lock:
+            detectors = dict(self._detectors)
+        report = []
+        for spec in specs:
+            detector = detectors.get(spec.name)
+            report.append(
+                {
+                    "name": spec.name,
+                    "file_present": STUB_MODEL or spec.path.exists(),
+                    "stub": STUB_MODEL,
+                    "loaded": detector is not None,
+                    "input_size": list(spec.input_size),
+                    "normalization": spec.normalization,
+                    "weight": spec.weight,
+                    "loaded_at": detector.loaded_at if detector else None,
+                }
+            )
+        return report
+
+    def primary_input_size(self) -> Tuple[int, int]:
+        return self.specs()[0].input_size
+
+    def score(self, frames_rgb: Sequence[np.ndarray]) -> Dict[str, Any]:
+        """Score RGB frames with every detector and fuse the per-model averages."""
+        if not frames_rgb:
+            raise ValueError("No frames supplied for scoring.")
+        detectors = [self._get(spec) for spec in self.specs()]
+
+        resized: Dict[Tuple[int, int], np.ndarray] = {}
+        batches: Dict[Tuple[Tuple[int, int], str], np.ndarray] = {}
+        with span("preprocess", frames=len(frames_rgb)) as stage:
+            for detector in detectors:
+                spec = detector.spec
+                if spec.input_size not in resized:
+                    resized[spec.input_size] = np.stack(
+                        [resize_rgb(frame, spec.input_size) for frame in frames_rgb]
+                    )
+                key = (spec.input_size, spec.normalization)
+                if key not in batches:
+                    batches[key] = normalize(resized[spec.input_size], spec.normalization)
+            stage["bytes"] = sum(batch.nbytes for batch in batches.values())
+
+        inputs = [batches[(detector.spec.input_size, detector.spec.normalization)] for detector in detectors]
+        if profiling_active():
+            # The profiler only sees this thread, so keep predictions on it.
+            outcomes = [self._run_detector(detector, batch) for detector, batch in zip(detectors, inputs)]
+        else:
+            # copy_context() carries the active request trace into detector threads.
+            futures = [
+                self._executor.submit(contextvars.copy_context().run, self._run_detector, detector, batch)
+                for detector, batch in zip(detectors, inputs)
+            ]
+            outcomes = [future.result() for future in futures]
+        probability = self._fuse(
+            [(fake_prob, detector.spec.weight) for detector, (fake_prob, _) in zip(detectors, outcomes)]
+        )
+        return {"probability": probability, "models": [payload for _, payload in outcomes]}
+
+    @staticmethod
+    def _run_detector(detector: LoadedDetector, batch: np.ndarray) -> Tuple[float, Dict[str, Any]]:
+        started = time.perf_counter()
+        with span("predict", model=detector.spec.name, bytes=batch.nbytes):
+            raw_prediction = detector.model.predict(batch, verbose=0)
+        latency_ms = (time.perf_counter() - started) * 1000
+        fake_prob = float(np.mean(_fake_probabilities(raw_prediction, len(batch))))
+        fake_prob = max(0.0, min(1.0, fake_prob))
+        return fake_prob, {
+            "name": detector.spec.name,
+            "fake_prob": round(fake_prob, 4),
+            "real_prob": round(1 - fake_prob, 4),
+            "confidence": round(max(fake_prob, 1 - fake_prob), 4),
+            "weight": detector.spec.weight,
+            "input_size": list(detector.spec.input_size),
+            "latency_ms": round(latency_ms, 2),
+        }
+
+    def _fuse(self, weighted: List[Tuple[float, float]]) -> float:
+        if self._fusion == "max":
+            return max(probability for probability, _ in weighted)
+        total_weight = sum(weight for _, weight in weighted)
+        if total_weight <= 0:
+            return sum(probability for probability, _ in weighted) / len(weighted)
+        return sum(probability * weight for probability, weight in weighted) / total_weight
+
+
+registry = ModelRegistry(
+    models_dir=MODELS_DIR,
+    manifest_path=DETECTOR_MANIFEST,
+    default_model_path=MODEL_PATH,
+    fusion=FUSION_STRATEGY,
+    workers=DETECTOR_WORKERS,
+)
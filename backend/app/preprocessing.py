@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Tuple
+from typing import Callable, Dict, Tuple
 
 import cv2
 import numpy as np
@@ -10,11 +10,32 @@ from tensorflow.keras.applications.efficientnet_v2 import preprocess_input
 
 IMAGE_SIZE: Tuple[int, int] = (256, 256)
 
+NORMALIZERS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "efficientnet_v2": preprocess_input,
+    "unit": lambda array: array / 255.0,
+    "symmetric": lambda array: array / 127.5 - 1.0,
+    "raw": lambda array: array,
+}
+
+
+def resize_rgb(rgb_image: np.ndarray, size: Tuple[int, int] = IMAGE_SIZE) -> np.ndarray:
+    """Resize an RGB array to ``size`` (width, height) without normalizing it."""
+    return cv2.resize(rgb_image, tuple(size), interpolation=cv2.INTER_AREA)
+
+
+def normalize(resized: np.ndarray, normalization: str = "efficientnet_v2") -> np.ndarray:
+    """Apply a named normalization to resized uint8 pixels and return float32."""
+    try:
+        normalizer = NORMALIZERS[normalization]
+    except KeyError as exc:
+        raise ValueError(
+            f"Unknown normalization '{normalization}'. Supported: {sorted(NORMALIZERS)}"
+        ) from exc
+    return normalizer(resized.astype(np.float32)).astype(np.float32, copy=False)
+
 
 def _prepare_tensor(rgb_image: np.ndarray) -> np.ndarray:
-    resized = cv2.resize(rgb_image, IMAGE_SIZE, interpolation=cv2.INTER_AREA)
-    float32 = resized.astype(np.float32)
-    processed = preprocess_input(float32)
+    processed = normalize(resize_rgb(rgb_image, IMAGE_SIZE))
     return np.expand_dims(processed, axis=0)
 
 
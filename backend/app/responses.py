@@ -0,0 +1,159 @@
+"""Response projection profiles and content negotiation for analysis payloads."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+try:  # Optional fast encoders; plain JSONResponse is used when they are missing.
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+class NotAcceptableError(ValueError):
+    """Raised when the client only accepts an encoding this server cannot produce."""
+
+# Fields dropped by the compact profile: duplicates of top-level data and per-frame detail.
+PROFILES: Dict[str, Tuple[str, ...]] = {
+    "full": (),
+    "compact": (
+        "frame_results",
+        "llm.analysis_data",
+        "llm.raw_llm_response",
+        "llm.label",
+        "llm.confidence",
+        "llm.context",
+        "llm.filename",
+        "llm.ollama_endpoint",
+    ),
+}
+
+
+@dataclass(frozen=True)
+class ResponseOptions:
+    """Client-selected projection and encoding for an analysis response."""
+
+    profile: str = "full"
+    fields: Tuple[str, ...] = ()
+    msgpack: bool = False
+
+    @classmethod
+    def from_request(cls, request: Request) -> "ResponseOptions":
+        """Parse ``?profile=``/``?compact=``/``?fields=`` and the Accept header."""
+        params = request.query_params
+        profile = (params.get("profile") or "").lower()
+        if not profile:
+            profile = "compact" if (params.get("compact") or "").lower() in ("1", "true", "yes") else "full"
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown response profile '{profile}'. Supported: {sorted(PROFILES)}")
+        fields = tuple(field.strip() for field in (params.get("fields") or "").split(",") if field.strip())
+        ranges = _parse_accept(request.headers.get("accept") or "")
+        json_preference = _preference(ranges, "application/json")
+        msgpack_preference = max(_preference(ranges, media_type) for media_type in MSGPACK_MEDIA_TYPES)
+        wants_msgpack = msgpack_preference[0] > 0 and msgpack_preference > json_preference
+        if wants_msgpack and msgpack is None:
+            if json_preference[0] <= 0:
+                raise NotAcceptableError("MessagePack responses require the optional 'msgpack' package.")
+            wants_msgpack = False
+        return cls(profile=profile, fields=fields, msgpack=wants_msgpack)
+
+
+def _parse_accept(header: str) -> List[Tuple[str, float]]:
+    """Split an Accept header into ``(media_range, q)`` pairs."""
+    ranges = []
+    for item in header.lower().split(","):
+        media_range, *params = (part.strip() for part in item.split(";"))
+        if not media_range:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = max(0.0, min(1.0, float(value)))
+                except ValueError:
+                    quality = 0.0
+        ranges.append((media_range, quality))
+    return ranges
+
+
+def _preference(ranges: List[Tuple[str, float]], media_type: str) -> Tuple[float, int]:
+    """Return ``(q, specificity)`` of the most specific range matching ``media_type``.
+
+    An absent header accepts everything; ties in ``q`` go to the more specific match.
+    """
+    if not ranges:
+        return 1.0, 0
+    candidates = {media_type: 2, media_type.split("/")[0] + "/*": 1, "*/*": 0}
+    matches = [(candidates[media_range], quality) for media_range, quality in ranges if media_range in candidates]
+    if not matches:
+        return 0.0, -1
+    specificity, quality = max(matches)
+    return quality, specificity
+
+
+def _drop_path(content: Dict[str, Any], parts: list[str]) -> Dict[str, Any]:
+    head = parts[0]
+    if head not in content:
+        return content
+    copy = dict(content)
+    if len(parts) == 1:
+        del copy[head]
+    elif isinstance(copy[head], dict):
+        copy[head] = _drop_path(copy[head], parts[1:])
+    return copy
+
+
+def drop_fields(content: Dict[str, Any], paths: Iterable[str]) -> Dict[str, Any]:
+    """Return ``content`` without the dotted ``paths``; the input is not mutated."""
+    for path in paths:
+        content = _drop_path(content, path.split("."))
+    return content
+
+
+def select_fields(content: Dict[str, Any], paths: Iterable[str]) -> Dict[str, Any]:
+    """Return only the dotted ``paths`` present in ``content``, keeping their nesting."""
+    projected: Dict[str, Any] = {}
+    for path in paths:
+        parts = path.split(".")
+        value: Any = content
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = projected
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return projected
+
+
+def render_response(content: Dict[str, Any], options: ResponseOptions, status_code: int = 200) -> Response:
+    """Project ``content`` per ``options`` and encode it with the fastest available encoder."""
+    content = drop_fields(content, PROFILES[options.profile])
+    if options.fields:
+        content = select_fields(content, options.fields)
+    if options.msgpack:
+        return Response(
+            content=msgpack.packb(content, use_bin_type=True),
+            status_code=status_code,
+            media_type=MSGPACK_MEDIA_TYPES[0],
+        )
+    if orjson is not None:
+        return Response(
+            content=orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS),
+            status_code=status_code,
+            media_type="application/json",
+        )
+    return JSONResponse(content=content, status_code=status_code)
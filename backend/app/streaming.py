@@ -0,0 +1,243 @@
+"""Incremental parsing and aggregation for large frame batch payloads."""
+from __future__ import annotations
+
+import heapq
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Tuple
+
+_STRING_STOP = re.compile(rb'["\\]')
+_WHITESPACE = b" \t\r\n"
+_QUOTE = ord('"')
+_BACKSLASH = ord("\\")
+_COMMA = ord(",")
+
+
+class PayloadTooLargeError(ValueError):
+    """Raised when a single JSON value exceeds the streaming buffer bound."""
+
+
+class FrameStreamParser:
+    """Pull-based parser for ``{"frames": [...], "context": ...}`` read off a byte stream.
+
+    Only the JSON value currently being read is buffered, so memory stays below
+    ``max_value_bytes`` however many frames the batch contains. Entries of the
+    top-level ``frames`` array are yielded as ``("frame", bytes)``; every other
+    top-level key is yielded as ``("field", (key, value))``.
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes], max_value_bytes: int) -> None:
+        self._chunks = chunks.__aiter__()
+        self._buf = bytearray()
+        self._pos = 0
+        self._eof = False
+        self._max_value_bytes = max_value_bytes
+
+    async def _fill(self) -> bool:
+        if self._eof:
+            return False
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            return False
+        if self._pos:
+            del self._buf[: self._pos]
+            self._pos = 0
+        self._buf += chunk
+        return True
+
+    def _check_size(self, value: bytearray) -> None:
+        if len(value) > self._max_value_bytes:
+            raise PayloadTooLargeError(
+                f"JSON value exceeds streaming limit of {self._max_value_bytes / (1024 * 1024):.2f} MB."
+            )
+
+    async def _peek(self) -> int:
+        """Return the next non-whitespace byte without consuming it."""
+        while True:
+            while self._pos < len(self._buf):
+                byte = self._buf[self._pos]
+                if byte in _WHITESPACE:
+                    self._pos += 1
+                    continue
+                return byte
+            if not await self._fill():
+                raise ValueError("Unexpected end of JSON payload.")
+
+    async def _expect(self, token: bytes) -> None:
+        if await self._peek() != token[0]:
+            raise ValueError(f"Malformed JSON payload: expected '{token.decode()}'.")
+        self._pos += 1
+
+    async def _read_string(self) -> bytes:
+        """Read a JSON string and return its unescaped UTF-8 bytes."""
+        await self._expect(b'"')
+        value = bytearray()
+        escaped = False
+        while True:
+            match = _STRING_STOP.search(self._buf, self._pos)
+            if match is None:
+                value += self._buf[self._pos :]
+                self._pos = len(self._buf)
+                self._check_size(value)
+                if not await self._fill():
+                    raise ValueError("Unterminated string in JSON payload.")
+                continue
+            end = match.start()
+            value += self._buf[self._pos : end]
+            if self._buf[end] == _QUOTE:
+                self._pos = end + 1
+                break
+            if end + 1 >= len(self._buf):
+                self._pos = end
+                if not await self._fill():
+                    raise ValueError("Unterminated string in JSON payload.")
+                continue
+            value += self._buf[end : end + 2]
+            self._pos = end + 2
+            escaped = True
+            self._check_size(value)
+        self._check_size(value)
+        if escaped:
+            return json.loads(b'"' + bytes(value) + b'"').encode("utf-8")
+        return bytes(value)
+
+    async def _read_value(self) -> Any:
+        """Read any non-string JSON value (bounded) and decode it."""
+        raw = bytearray()
+        depth = 0
+        in_string = False
+        escape = False
+        while True:
+            if self._pos >= len(self._buf):
+                if not await self._fill():
+                    break
+                continue
+            byte = self._buf[self._pos]
+            if in_string:
+                if escape:
+                    escape = False
+                elif byte == _BACKSLASH:
+                    escape = True
+                elif byte == _QUOTE:
+                    in_string = False
+            elif byte == _QUOTE:
+                in_string = True
+            elif byte in b"[{":
+                depth += 1
+            elif byte in b"]}":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif byte == _COMMA and depth == 0:
+                break
+            raw.append(byte)
+            self._pos += 1
+            self._check_size(raw)
+        return json.loads(raw)
+
+    async def _next_delimiter(self, closing: bytes) -> bool:
+        """Consume ',' or ``closing``; return True when the container is closed."""
+        delimiter = await self._peek()
+        self._pos += 1
+        if delimiter == closing[0]:
+            return True
+        if delimiter != _COMMA:
+            raise ValueError("Malformed JSON payload: expected ',' or closing bracket.")
+        return False
+
+    async def events(self) -> AsyncIterator[Tuple[str, Any]]:
+        await self._expect(b"{")
+        if await self._peek() == ord("}"):
+            self._pos += 1
+            return
+        while True:
+            key = (await self._read_string()).decode("utf-8")
+            await self._expect(b":")
+            first = await self._peek()
+            if key == "frames" and first == ord("["):
+                self._pos += 1
+                if await self._peek() == ord("]"):
+                    self._pos += 1
+                else:
+                    while True:
+                        if await self._peek() != _QUOTE:
+                            raise ValueError("Each entry in 'frames' must be a base64 string.")
+                        yield "frame", await self._read_string()
+                        if await self._next_delimiter(b"]"):
+                            break
+            elif first == _QUOTE:
+                yield "field", (key, (await self._read_string()).decode("utf-8"))
+            else:
+                yield "field", (key, await self._read_value())
+            if await self._next_delimiter(b"}"):
+                return
+
+
+class FrameAggregate:
+    """Running totals for a frame batch; decoded frames are never retained.
+
+    Per-frame detail is limited to the ``top_k`` most suspicious frames, so memory
+    and response size stay constant whatever the batch size.
+    """
+
+    def __init__(self, top_k: int = 0) -> None:
+        self.count = 0
+        self.model: str | None = None
+        self.fusion: str | None = None
+        self.artifacts: List[str] = []
+        self._top_k = max(0, top_k)
+        self._top_frames: List[Tuple[float, int, str]] = []
+        self._fake_sum = 0.0
+        self._models: Dict[str, Dict[str, float]] = {}
+
+    def add(self, result: Dict[str, Any]) -> None:
+        fake_prob = result["probabilities"]["fake"]
+        self._fake_sum += fake_prob
+        if self._top_k:
+            entry = (fake_prob, self.count, result["label"])
+            if len(self._top_frames) < self._top_k:
+                heapq.heappush(self._top_frames, entry)
+            else:
+                heapq.heappushpop(self._top_frames, entry)
+        self.count += 1
+        self.model = self.model or result.get("model")
+        self.fusion = self.fusion or result.get("fusion")
+        for artifact in result.get("artifacts", []):
+            if artifact not in self.artifacts:
+                self.artifacts.append(artifact)
+        for model in result.get("models", []):
+            entry = self._models.setdefault(model["name"], {"fake_sum": 0.0, "latency_ms": 0.0, "count": 0})
+            entry["fake_sum"] += model["fake_prob"]
+            entry["latency_ms"] += model.get("latency_ms", 0.0)
+            entry["count"] += 1
+
+    def top_frames(self) -> List[Dict[str, Any]]:
+        """Return the retained most-suspicious frames, highest fake probability first."""
+        return [
+            {"index": index, "label": label, "fake_prob": fake_prob}
+            for fake_prob, index, label in sorted(self._top_frames, reverse=True)
+        ]
+
+    @property
+    def fake_probability(self) -> float:
+        if not self.count:
+            return 0.0
+        return max(0.0, min(1.0, self._fake_sum / self.count))
+
+    def model_results(self) -> List[Dict[str, Any]]:
+        """Average each detector's per-frame scores and sum its latency across the batch."""
+        aggregated = []
+        for name, entry in self._models.items():
+            fake_prob = entry["fake_sum"] / entry["count"]
+            aggregated.append(
+                {
+                    "name": name,
+                    "fake_prob": round(fake_prob, 4),
+                    "real_prob": round(1 - fake_prob, 4),
+                    "confidence": round(max(fake_prob, 1 - fake_prob), 4),
+                    "latency_ms": round(entry["latency_ms"], 2),
+                }
+            )
+        return aggregated
@@ -0,0 +1,351 @@
+"""Opt-in per-request span tracing and profiling for ``/analyze`` requests.
+
+A request is traced when it carries ``X-Profile: <mode>`` together with a valid
+``X-Profile-Token``, when an admin has armed profiling for upcoming requests, or
+when it is picked by ``TRACE_SAMPLE_RATE`` sampling. Untraced requests only pay a
+``ContextVar`` lookup per ``span()``.
+
+``cprofile`` and ``pyinstrument`` only see the thread that starts them, so they
+are not started on the event loop: analysis workers wrap their work in
+``profiled()`` and the per-thread sections are merged when the request finishes.
+Profiles and ``traces.log`` lines are written by a background writer thread, never
+on the event loop.
+"""
+from __future__ import annotations
+
+import cProfile
+import json
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from functools import reduce
+from pathlib import Path
+from threading import Lock, current_thread
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+from uuid import uuid4
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .config import LOG_DIR, PROFILE_TOKEN, TRACE_SAMPLE_RATE
+
+try:  # Optional sampling profiler.
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # pragma: no cover - optional dependency
+    PyinstrumentProfiler = None
+
+TRACE_LOG_PATH = LOG_DIR / "traces.log"
+PROFILE_DIR = LOG_DIR / "profiles"
+PROFILE_MODES = ("trace", "cprofile", "pyinstrument", "tf")
+RECENT_TRACE_LIMIT = 100
+
+T = TypeVar("T")
+
+_CURRENT_TRACE: ContextVar[Optional["Trace"]] = ContextVar("deepfake_trace", default=None)
+_TF_PROFILER_LOCK = Lock()
+# cProfile (sys.monitoring on 3.12+) and pyinstrument allow one session at a time.
+_PROFILER_LOCK = Lock()
+_THREAD_STATE = threading.local()
+# One writer keeps traces.log appends ordered and off the event loop.
+_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer")
+
+
+@dataclass
+class Trace:
+    """Spans and optional profiler output collected for a single request."""
+
+    trace_id: str
+    path: str
+    reason: str
+    mode: str
+    started_at: float = field(default_factory=time.time)
+    spans: List[Dict[str, Any]] = field(default_factory=list)
+    profile_path: Optional[str] = None
+    profile_skipped: int = 0
+    _origin: float = field(default_factory=time.perf_counter, repr=False)
+    _lock: Lock = field(default_factory=Lock, repr=False)
+    _profiler: Any = field(default=None, repr=False)
+    _sections: List[Any] = field(default_factory=list, repr=False)
+    _token: Optional[Token] = field(default=None, repr=False)
+
+    def record(self, name: str, started: float, attributes: Dict[str, Any]) -> None:
+        entry = {
+            "name": name,
+            "start_ms": round((started - self._origin) * 1000, 3),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "thread": current_thread().name,
+            **attributes,
+        }
+        with self._lock:
+            self.spans.append(entry)
+
+    def add_section(self, section: Any) -> None:
+        with self._lock:
+            self._sections.append(section)
+
+    def skip_section(self) -> None:
+        with self._lock:
+            self.profile_skipped += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+            sections = len(self._sections)
+        return {
+            "trace_id": self.trace_id,
+            "path": self.path,
+            "reason": self.reason,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "total_ms": round((time.perf_counter() - self._origin) * 1000, 3),
+            "profile_path": self.profile_path,
+            "profile_sections": sections,
+            "profile_skipped": self.profile_skipped,
+            "spans": spans,
+        }
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Time a pipeline stage on the active trace; set ``bytes`` etc. on the yielded dict."""
+    trace = _CURRENT_TRACE.get()
+    if trace is None:
+        yield attributes
+        return
+    started = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        trace.record(name, started, attributes)
+
+
+class TracingController:
+    """Holds runtime sampling/arming state and the most recent finished traces."""
+
+    def __init__(self, sample_rate: float) -> None:
+        self._lock = Lock()
+        self.sample_rate = sample_rate
+        self._armed_count = 0
+        self._armed_mode = "trace"
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=RECENT_TRACE_LIMIT)
+
+    def configure(self, sample_rate: Optional[float], arm: Optional[int], mode: Optional[str]) -> Dict[str, Any]:
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}'. Supported: {list(PROFILE_MODES)}")
+        if sample_rate is not None and not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1.")
+        with self._lock:
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if arm is not None:
+                self._armed_count = max(0, arm)
+            if mode is not None:
+                self._armed_mode = mode
+        return self.state()
+
+    def state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "armed_requests": self._armed_count,
+                "armed_mode": self._armed_mode,
+                "recent_traces": [trace["trace_id"] for trace in self._recent],
+            }
+
+    def _take_armed(self) -> Optional[str]:
+        with self._lock:
+            if self._armed_count <= 0:
+                return None
+            self._armed_count -= 1
+            return self._armed_mode
+
+    def decide(self, request: Request) -> Optional[tuple[str, str]]:
+        """Return ``(reason, mode)`` when this request should be traced."""
+        requested = (request.headers.get("x-profile") or "").lower()
+        if requested:
+            if not is_privileged(request):
+                return None
+            return "header", requested if requested in PROFILE_MODES else "trace"
+        armed_mode = self._take_armed()
+        if armed_mode is not None:
+            return "armed", armed_mode
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled", "trace"
+        return None
+
+    def remember(self, trace: Dict[str, Any]) -> None:
+        with self._lock:
+            self._recent.append(trace)
+
+    def find(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((trace for trace in self._recent if trace["trace_id"] == trace_id), None)
+
+
+controller = TracingController(TRACE_SAMPLE_RATE)
+
+
+def is_privileged(request: Request) -> bool:
+    return bool(PROFILE_TOKEN) and request.headers.get("x-profile-token") == PROFILE_TOKEN
+
+
+def profiling_active() -> bool:
+    """True while the calling thread is inside a ``profiled()`` section."""
+    return getattr(_THREAD_STATE, "profiling", False)
+
+
+def _start_section(mode: str) -> Any:
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    profiler = PyinstrumentProfiler(async_mode="disabled")
+    profiler.start()
+    return profiler
+
+
+def _stop_section(mode: str, profiler: Any) -> Any:
+    if mode == "cprofile":
+        profiler.disable()
+        return profiler
+    return profiler.stop()
+
+
+@contextmanager
+def profiled() -> Iterator[None]:
+    """Profile the enclosed work on the calling thread if the active trace asks for it.
+
+    Only one section runs at a time process-wide; when another request holds the
+    profiler the section is counted in ``profile_skipped`` and only spans are kept.
+    """
+    trace = _CURRENT_TRACE.get()
+    wanted = trace is not None and (
+        trace.mode == "cprofile" or (trace.mode == "pyinstrument" and PyinstrumentProfiler is not None)
+    )
+    if not wanted or profiling_active():
+        yield
+        return
+    profiler = None
+    if _PROFILER_LOCK.acquire(blocking=False):
+        try:
+            profiler = _start_section(trace.mode)
+        except Exception:  # pylint: disable=broad-except
+            _PROFILER_LOCK.release()
+    if profiler is None:
+        trace.skip_section()
+        yield
+        return
+    _THREAD_STATE.profiling = True
+    try:
+        yield
+    finally:
+        _THREAD_STATE.profiling = False
+        try:
+            trace.add_section(_stop_section(trace.mode, profiler))
+        finally:
+            _PROFILER_LOCK.release()
+
+
+def run_profiled(func: Callable[..., T], *args: Any) -> T:
+    """Call ``func`` inside ``profiled()``; meant to be handed to a threadpool."""
+    with profiled():
+        return func(*args)
+
+
+def _start_tf_profiler(trace: Trace) -> None:
+    if not _TF_PROFILER_LOCK.acquire(blocking=False):
+        return
+    try:
+        import tensorflow as tf  # Imported lazily; only needed for TF traces.
+
+        logdir = PROFILE_DIR / f"{trace.trace_id}_tf"
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        tf.profiler.experimental.start(str(logdir))
+    except Exception:  # pylint: disable=broad-except
+        _TF_PROFILER_LOCK.release()
+        return
+    trace._profiler = tf.profiler.experimental
+    trace.profile_path = str(logdir)
+
+
+def _profile_target(trace: Trace) -> Optional[Path]:
+    if trace.mode not in ("cprofile", "pyinstrument"):
+        return None
+    with trace._lock:
+        if not trace._sections:
+            return None
+    suffix = ".prof" if trace.mode == "cprofile" else ".html"
+    return PROFILE_DIR / f"{trace.trace_id}{suffix}"
+
+
+def _write_profile(trace: Trace, path: Path) -> None:
+    with trace._lock:
+        sections = list(trace._sections)
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    if trace.mode == "cprofile":
+        stats = pstats.Stats(sections[0])
+        for section in sections[1:]:
+            stats.add(section)
+        stats.dump_stats(str(path))
+    else:
+        from pyinstrument.renderers import HTMLRenderer
+        from pyinstrument.session import Session
+
+        session = reduce(Session.combine, sections)
+        path.write_text(HTMLRenderer().render(session), encoding="utf-8")
+
+
+def _persist(trace: Trace, payload: Dict[str, Any]) -> None:
+    """Writer-thread half of ``finish_request_trace``: stop/flush profilers, append the log."""
+    try:
+        if trace._profiler is not None:  # Only set while this trace holds the TF profiler.
+            try:
+                trace._profiler.stop()
+            finally:
+                _TF_PROFILER_LOCK.release()
+        elif payload["profile_path"] is not None:
+            _write_profile(trace, Path(payload["profile_path"]))
+    except Exception:  # pylint: disable=broad-except
+        payload["profile_path"] = None
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    with TRACE_LOG_PATH.open("a", encoding="utf-8") as log_file:
+        log_file.write(json.dumps(payload) + "\n")
+
+
+def start_request_trace(request: Request) -> Optional[Trace]:
+    """Begin tracing ``request`` if selected; the trace becomes active for this context."""
+    decision = controller.decide(request)
+    if decision is None:
+        return None
+    reason, mode = decision
+    trace = Trace(trace_id=uuid4().hex, path=request.url.path, reason=reason, mode=mode)
+    trace._token = _CURRENT_TRACE.set(trace)
+    if mode == "tf":
+        _start_tf_profiler(trace)
+    return trace
+
+
+def finish_request_trace(trace: Optional[Trace], response: Optional[Response]) -> None:
+    """Tag the response and hand the trace to the background writer.
+
+    Profile files may appear shortly after the response is sent.
+    """
+    if trace is None:
+        return
+    if trace._token is not None:
+        _CURRENT_TRACE.reset(trace._token)
+    profile_path = _profile_target(trace)
+    if profile_path is not None:
+        trace.profile_path = str(profile_path)
+    payload = trace.to_dict()
+    if response is not None:
+        payload["status_code"] = response.status_code
+        response.headers["X-Trace-Id"] = trace.trace_id
+    controller.remember(payload)
+    _WRITER.submit(_persist, trace, payload)
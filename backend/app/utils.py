@@ -4,10 +4,14 @@ from __future__ import annotations
 import hashlib
 import json
 import os
+import shutil
+import stat
+import time
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable, List
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
 from uuid import uuid4
 
 from fastapi import UploadFile
@@ -15,10 +19,13 @@ from fastapi import UploadFile
 from .config import (
     ALLOWED_EXTENSIONS,
     IMAGE_EXTENSIONS,
+    INLINE_IMAGE_MAX_BYTES,
     LOG_DIR,
     MAX_FILE_BYTES,
     MAX_FILE_MB,
     TEMP_DIR,
+    TEMP_STORE_MAX_BYTES,
+    TEMP_TTL_SECONDS,
     VIDEO_EXTENSIONS,
 )
 
@@ -28,12 +35,113 @@ CHUNK_SIZE = 1024 * 1024
 
 @dataclass(frozen=True)
 class SavedFile:
-    """Metadata returned after persisting an upload to disk."""
+    """Metadata for an ingested upload, held either on disk (``path``) or in memory (``data``)."""
 
-    path: Path
+    path: Optional[Path]
     sha256: str
     size_bytes: int
     media_type: str
+    data: Optional[bytes] = None
+
+
+@dataclass(frozen=True)
+class UploadInfo:
+    """Validated identity of an upload, computed before anything is copied."""
+
+    sha256: str
+    size_bytes: int
+    media_type: str
+
+
+class TempStorageFullError(RuntimeError):
+    """Raised when an upload cannot fit in the temp store even after eviction."""
+
+
+class TempStore:
+    """Size-capped temp directory shared by every uvicorn worker.
+
+    Each upload reserves its size up front and its file is deleted on ``release``;
+    there is no retention, so nothing live is ever evicted. Files other processes
+    wrote within the TTL count towards the cap but are never touched, while files
+    older than the TTL are leftovers of dead processes and are deleted on the next
+    reservation.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, ttl_seconds: float) -> None:
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._ttl_seconds = ttl_seconds
+        self._lock = Lock()
+        self._entries: Dict[Path, int] = {}
+        self._total_bytes = 0
+
+    def _scan(self, own: Iterable[Path]) -> Tuple[int, List[Tuple[Path, int]]]:
+        """Return the bytes other live processes hold and the stale leftovers."""
+        own = set(own)
+        cutoff = time.time() - self._ttl_seconds
+        foreign_bytes = 0
+        stale: List[Tuple[Path, int]] = []
+        for path in self._directory.iterdir():
+            if path in own:
+                continue
+            try:
+                info = path.stat()
+            except OSError:  # Removed by its owner while scanning.
+                continue
+            if not stat.S_ISREG(info.st_mode):
+                continue
+            if info.st_mtime <= cutoff:
+                stale.append((path, info.st_size))
+            else:
+                foreign_bytes += info.st_size
+        return foreign_bytes, stale
+
+    def reserve(self, extension: str, size_bytes: int) -> Path:
+        """Allocate a path for an upload of ``size_bytes``, clearing stale leftovers first."""
+        with self._lock:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            foreign_bytes, stale = self._scan(self._entries)
+            for path, size in stale:
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError:  # Still counts against the cap until someone can remove it.
+                    foreign_bytes += size
+            in_use = self._total_bytes + foreign_bytes
+            if in_use + size_bytes > self._max_bytes:
+                raise TempStorageFullError(
+                    f"Temporary storage is full ({in_use / (1024 * 1024):.1f} MB in use "
+                    f"of {self._max_bytes / (1024 * 1024):.0f} MB); retry shortly."
+                )
+            path = self._directory / f"{uuid4().hex}{extension}"
+            self._entries[path] = size_bytes
+            self._total_bytes += size_bytes
+            return path
+
+    def release(self, path: Path) -> None:
+        """Delete ``path`` once its request is done."""
+        with self._lock:
+            self._total_bytes -= self._entries.pop(path, 0)
+        path.unlink(missing_ok=True)
+
+    def usage(self) -> dict:
+        """Report usage without deleting anything; cheap enough for readiness probes."""
+        with self._lock:
+            own = list(self._entries)
+            used_bytes = self._total_bytes
+        foreign_bytes, stale = self._scan(own) if self._directory.exists() else (0, [])
+        return {
+            "status": "ok" if os.access(self._directory, os.W_OK) else "unavailable",
+            "files": len(own),
+            "used_bytes": used_bytes,
+            "other_workers_bytes": foreign_bytes,
+            "stale_files": len(stale),
+            "stale_bytes": sum(size for _, size in stale),
+            "max_bytes": self._max_bytes,
+            "ttl_seconds": self._ttl_seconds,
+        }
+
+
+temp_store = TempStore(TEMP_DIR, TEMP_STORE_MAX_BYTES, TEMP_TTL_SECONDS)
 
 
 def get_extension(filename: str) -> str:
@@ -69,40 +177,51 @@ def ensure_file_size_within_limit(file: UploadFile) -> int:
     return size
 
 
-def save_temp_file(file: UploadFile) -> SavedFile:
-    """Persist the incoming upload to the TEMP_DIR for downstream processing."""
+def inspect_upload(file: UploadFile) -> UploadInfo:
+    """Validate an upload and hash it in place, without copying it anywhere."""
     filename = file.filename or "upload"
     ensure_supported_extension(filename)
     size_bytes = ensure_file_size_within_limit(file)
-    extension = get_extension(filename)
-    media_type = detect_media_type(extension)
-
-    TEMP_DIR.mkdir(parents=True, exist_ok=True)
-    destination = TEMP_DIR / f"{uuid4().hex}{extension}"
+    media_type = detect_media_type(get_extension(filename))
     file.file.seek(0)
-
     digest = hashlib.sha256()
-    with destination.open("wb") as buffer:
-        while True:
-            chunk = file.file.read(CHUNK_SIZE)
-            if not chunk:
-                break
-            buffer.write(chunk)
-            digest.update(chunk)
+    while True:
+        chunk = file.file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
     file.file.seek(0)
-    return SavedFile(path=destination, sha256=digest.hexdigest(), size_bytes=size_bytes, media_type=media_type)
+    return UploadInfo(sha256=digest.hexdigest(), size_bytes=size_bytes, media_type=media_type)
+
 
+def save_temp_file(file: UploadFile, info: UploadInfo) -> SavedFile:
+    """Ingest an inspected upload: small images stay in memory, everything else goes to the temp store.
 
-def temp_storage_ready() -> bool:
-    """Verify we can write/delete files in TEMP_DIR."""
+    Disk-backed results must be handed back via ``release_saved_file`` when done.
+    """
+    file.file.seek(0)
+    if info.media_type == "image" and info.size_bytes <= INLINE_IMAGE_MAX_BYTES:
+        data = file.file.read()
+        file.file.seek(0)
+        return SavedFile(
+            path=None, sha256=info.sha256, size_bytes=len(data), media_type=info.media_type, data=data
+        )
+
+    destination = temp_store.reserve(get_extension(file.filename or "upload"), info.size_bytes)
     try:
-        TEMP_DIR.mkdir(parents=True, exist_ok=True)
-        test_file = TEMP_DIR / f".readiness_{uuid4().hex}"
-        test_file.write_text("ready-check", encoding="utf-8")
-        test_file.unlink(missing_ok=True)
-        return True
-    except OSError:
-        return False
+        with destination.open("wb") as buffer:
+            shutil.copyfileobj(file.file, buffer, CHUNK_SIZE)
+    except BaseException:
+        temp_store.release(destination)
+        raise
+    file.file.seek(0)
+    return SavedFile(path=destination, sha256=info.sha256, size_bytes=info.size_bytes, media_type=info.media_type)
+
+
+def release_saved_file(saved_file: SavedFile) -> None:
+    """Delete the temp copy backing ``saved_file`` (no-op for in-memory uploads)."""
+    if saved_file.path is not None:
+        temp_store.release(saved_file.path)
 
 
 def log_analysis_event(
@@ -0,0 +1,98 @@
+"""Parallel, segmented frame sampling for long videos.
+
+Each worker process opens its own ``cv2.VideoCapture`` over a contiguous time
+segment and writes the sampled BGR frames straight into a shared-memory buffer
+allocated by the parent, so frames never travel through pickle. This module is
+imported by spawned workers and must not pull in TensorFlow.
+"""
+from __future__ import annotations
+
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from threading import Lock
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .config import VIDEO_DECODE_WORKERS
+
+_POOL_LOCK = Lock()
+_POOL: ProcessPoolExecutor | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # Spawn rather than fork: the parent holds TensorFlow and detector threads.
+            _POOL = ProcessPoolExecutor(
+                max_workers=VIDEO_DECODE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _POOL
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next long video starts a fresh one."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _decode_segment(
+    path: str, shm_name: str, shape: Tuple[int, int, int, int], slots: Sequence[Tuple[int, int]]
+) -> List[Tuple[int, int, bool]]:
+    """Decode ``(slot, frame_index)`` pairs into the shared buffer; report which succeeded."""
+    shm = SharedMemory(name=shm_name)
+    try:
+        frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        cap = cv2.VideoCapture(path)
+        results = []
+        for slot, frame_index in slots:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            ret, frame = cap.read()
+            if not ret or frame.shape != shape[1:]:
+                results.append((slot, frame_index, False))
+                continue
+            frames[slot] = frame
+            results.append((slot, frame_index, True))
+        cap.release()
+        del frames
+    finally:
+        shm.close()
+    return results
+
+
+def extract_frames_segmented(
+    path: Path, frame_indices: Sequence[int], width: int, height: int
+) -> List[np.ndarray]:
+    """Decode ``frame_indices`` across worker processes and return BGR frames in timestamp order."""
+    shape = (len(frame_indices), height, width, 3)
+    shm = SharedMemory(create=True, size=int(np.prod(shape)))
+    try:
+        slots = list(enumerate(frame_indices))
+        segment_size = math.ceil(len(slots) / max(1, VIDEO_DECODE_WORKERS))
+        pool = _get_pool()
+        try:
+            futures = [
+                pool.submit(_decode_segment, str(path), shm.name, shape, slots[start : start + segment_size])
+                for start in range(0, len(slots), segment_size)
+            ]
+            decoded = [item for future in futures for item in future.result()]
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+        buffer = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        ordered = sorted((frame_index, slot) for slot, frame_index, ok in decoded if ok)
+        frames = [buffer[slot].copy() for _, slot in ordered]
+        del buffer
+    finally:
+        shm.close()
+        shm.unlink()
+    return frames
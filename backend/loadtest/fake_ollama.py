@@ -0,0 +1,104 @@
+"""Minimal stand-in for Ollama's ``/api/chat`` endpoint with tunable latency and failures."""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+CANNED_ANALYSIS = {
+    "final_verdict": "uncertain",
+    "risk_level": "medium",
+    "score_summary": "Load-test stand-in; scores were not inspected.",
+    "artefact_explanation": ["Synthetic response from the fake Ollama server."],
+    "overall_explanation": "This reasoning was produced by the load-test harness.",
+}
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Threaded HTTP server carrying the latency/failure knobs for its handler."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], latency_ms: float, jitter_ms: float, failure_rate: float) -> None:
+        super().__init__(address, FakeOllamaHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    server: FakeOllamaServer
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "fake-ollama"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        delay_ms = self.server.latency_ms + random.uniform(0, self.server.jitter_ms)
+        time.sleep(delay_ms / 1000)
+        if random.random() < self.server.failure_rate:
+            self._send_json(503, {"error": "injected failure"})
+            return
+        self._send_json(
+            200,
+            {
+                "model": request.get("model", "fake-ollama"),
+                "message": {"role": "assistant", "content": json.dumps(CANNED_ANALYSIS)},
+                "done": True,
+            },
+        )
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002 - silence per-request logs
+        return
+
+
+def start_fake_ollama(
+    host: str = "127.0.0.1",
+    port: int = 11535,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    failure_rate: float = 0.0,
+) -> FakeOllamaServer:
+    """Start the fake server on a daemon thread and return it (call ``shutdown()`` to stop)."""
+    server = FakeOllamaServer((host, port), latency_ms, jitter_ms, failure_rate)
+    Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11535)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeOllamaServer((args.host, args.port), args.latency_ms, args.jitter_ms, args.failure_rate)
+    print(f"Fake Ollama listening on http://{args.host}:{args.port}/api/chat")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+"""Drive mixed ``/analyze`` traffic against the backend with a fake Ollama and stub model.
+
+Examples (from the repository root)::
+
+    python -m backend.loadtest.run --concurrency 8 --duration 30
+    python -m backend.loadtest.run --rate 20 --duration 60 --mix image=5,frames=4,video=1
+    python -m backend.loadtest.run --ramp 1,2,4,8,16,32 --step-duration 15 --output load.json
+
+The harness starts ``backend.app.main:app`` under uvicorn with ``OLLAMA_URL`` pointed at
+``fake_ollama`` and ``DEEPFAKE_STUB_MODEL=1`` (unless ``--real-model``), then reports
+throughput, latency percentiles, error rates and the saturation point per endpoint.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import count
+from pathlib import Path
+from threading import Lock, Thread, local
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+import requests
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+ENDPOINTS = ("image", "video", "frames")
+REQUEST_TIMEOUT = 300
+
+
+@dataclass(frozen=True)
+class Sample:
+    endpoint: str
+    latency_ms: float
+    status: int
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200
+
+
+def _jpeg(pixels: np.ndarray, nonce: Optional[int]) -> bytes:
+    if nonce is not None:
+        pixels = pixels.copy()
+        # Stamp the nonce into the first row so every request decodes to distinct pixels.
+        pixels[0, :8, 0] = np.frombuffer(nonce.to_bytes(8, "little"), dtype=np.uint8)
+    ok, encoded = cv2.imencode(".jpg", pixels)
+    if not ok:
+        raise RuntimeError("OpenCV could not encode a JPEG test payload.")
+    return encoded.tobytes()
+
+
+def _mp4(rng: np.random.Generator) -> bytes:
+    with tempfile.TemporaryDirectory() as workdir:
+        video_path = Path(workdir) / "load.mp4"
+        writer = cv2.VideoWriter(str(video_path), cv2.VideoWriter_fourcc(*"mp4v"), 10, (320, 240))
+        for _ in range(30):
+            writer.write(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8))
+        writer.release()
+        return video_path.read_bytes()
+
+
+class PayloadFactory:
+    """Pre-encodes request bodies from fixed random noise.
+
+    The backend coalesces concurrent requests with identical content, so each
+    endpoint gets a pool of distinct bodies: images and frames are encoded with a
+    nonce stamped into their pixels, and the MP4 gets a trailing ``free`` box (which
+    decoders skip). Pools are built up front so encoding never lands inside a timed
+    request; a body only repeats after ``pool_size`` requests to the same endpoint.
+    """
+
+    def __init__(self, frames_per_batch: int, image_size: int, endpoints: Sequence[str], pool_size: int) -> None:
+        rng = np.random.default_rng(0)
+        self._image = rng.integers(0, 256, (image_size, image_size, 3), dtype=np.uint8)
+        self._frames = [rng.integers(0, 256, (360, 640, 3), dtype=np.uint8) for _ in range(frames_per_batch)]
+        self._video = _mp4(rng)
+        self._shared = {endpoint: self._encode(endpoint, None) for endpoint in endpoints}
+        self._pools = {
+            endpoint: [self._encode(endpoint, nonce) for nonce in range(pool_size)] for endpoint in endpoints
+        }
+
+    def _encode(self, endpoint: str, nonce: Optional[int]) -> bytes:
+        if endpoint == "video":
+            if nonce is None:
+                return self._video
+            return self._video + (16).to_bytes(4, "big") + b"free" + nonce.to_bytes(8, "big")
+        if endpoint == "image":
+            return _jpeg(self._image, nonce)
+        frames = [base64.b64encode(_jpeg(frame, nonce)).decode("ascii") for frame in self._frames]
+        return json.dumps({"frames": frames, "context": "load-test"}).encode("utf-8")
+
+    def body(self, endpoint: str, sequence: Optional[int]) -> bytes:
+        """Return the ``sequence``-th pooled body, or the shared duplicate body for ``None``."""
+        if sequence is None:
+            return self._shared[endpoint]
+        pool = self._pools[endpoint]
+        return pool[sequence % len(pool)]
+
+
+class TrafficDriver:
+    """Issues weighted-random requests and records one ``Sample`` per request."""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        payloads: PayloadFactory,
+        mix: Dict[str, float],
+        duplicate_ratio: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self._base_url = base_url.rstrip("/")
+        self._api_key = api_key
+        self._payloads = payloads
+        self._duplicate_ratio = duplicate_ratio
+        self._sequences = {endpoint: count() for endpoint in mix}
+        self._endpoints = list(mix)
+        self._weights = [mix[name] for name in self._endpoints]
+        self._random = random.Random(seed)
+        self._random_lock = Lock()
+        self._local = local()
+        self._samples: List[Sample] = []
+        self._samples_lock = Lock()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def pick(self) -> str:
+        with self._random_lock:
+            return self._random.choices(self._endpoints, self._weights)[0]
+
+    def _sequence(self, endpoint: str) -> Optional[int]:
+        """Return the next pooled body index, or ``None`` to resend the shared body as a duplicate."""
+        with self._random_lock:
+            if self._duplicate_ratio and self._random.random() < self._duplicate_ratio:
+                return None
+            return next(self._sequences[endpoint])
+
+    def send(self, endpoint: str, scheduled_at: Optional[float] = None) -> None:
+        """Send one request; open-loop callers pass ``scheduled_at`` to avoid coordinated omission."""
+        data = self._payloads.body(endpoint, self._sequence(endpoint))  # Pre-built; no encoding here.
+        started = scheduled_at if scheduled_at is not None else time.perf_counter()
+        headers = {"X-API-Key": self._api_key}
+        session = self._session()
+        try:
+            if endpoint == "frames":
+                headers["Content-Type"] = "application/json"
+                response = session.post(
+                    f"{self._base_url}/analyze/frames?profile=compact",
+                    data=data,
+                    headers=headers,
+                    timeout=REQUEST_TIMEOUT,
+                )
+            else:
+                filename, mime = ("load.mp4", "video/mp4") if endpoint == "video" else ("load.jpg", "image/jpeg")
+                response = session.post(
+                    f"{self._base_url}/analyze?profile=compact",
+                    files={"file": (filename, data, mime)},
+                    data={"context": "load-test", "media_type": endpoint},
+                    headers=headers,
+                    timeout=REQUEST_TIMEOUT,
+                )
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        sample = Sample(endpoint=endpoint, latency_ms=(time.perf_counter() - started) * 1000, status=status)
+        with self._samples_lock:
+            self._samples.append(sample)
+
+    def drain(self) -> List[Sample]:
+        with self._samples_lock:
+            samples, self._samples = self._samples, []
+        return samples
+
+    def run_closed_loop(self, concurrency: int, duration: float) -> Tuple[List[Sample], float]:
+        """Keep ``concurrency`` requests in flight for ``duration`` seconds."""
+        started = time.perf_counter()
+        deadline = started + duration
+
+        def worker() -> None:
+            while time.perf_counter() < deadline:
+                self.send(self.pick())
+
+        threads = [Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.drain(), time.perf_counter() - started
+
+    def run_open_loop(self, rate: float, duration: float, max_in_flight: int) -> Tuple[List[Sample], float]:
+        """Start requests at a fixed ``rate`` per second regardless of completions."""
+        started = time.perf_counter()
+        deadline = started + duration
+        interval = 1.0 / rate
+        next_at = started
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            while next_at < deadline:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.send, self.pick(), next_at)
+                next_at += interval
+        return self.drain(), time.perf_counter() - started
+
+
+def _percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples: Sequence[Sample], elapsed: float) -> Dict[str, dict]:
+    """Return per-endpoint (plus ``all``) throughput, latency percentiles and error rate."""
+    grouped: Dict[str, List[Sample]] = defaultdict(list)
+    for sample in samples:
+        grouped[sample.endpoint].append(sample)
+        grouped["all"].append(sample)
+
+    summary = {}
+    for endpoint, group in grouped.items():
+        latencies = sorted(sample.latency_ms for sample in group)
+        errors = sum(1 for sample in group if not sample.ok)
+        summary[endpoint] = {
+            "requests": len(group),
+            "throughput_rps": round(sum(1 for sample in group if sample.ok) / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(errors / len(group), 4),
+            "p50_ms": round(_percentile(latencies, 0.50), 1),
+            "p90_ms": round(_percentile(latencies, 0.90), 1),
+            "p95_ms": round(_percentile(latencies, 0.95), 1),
+            "p99_ms": round(_percentile(latencies, 0.99), 1),
+            "max_ms": round(latencies[-1], 1),
+            "statuses": dict(Counter(str(sample.status) for sample in group)),
+        }
+    return summary
+
+
+def find_saturation(steps: Sequence[Tuple[float, Dict[str, dict]]], min_gain: float = 0.05) -> Dict[str, Optional[float]]:
+    """Return, per endpoint, the last load level before throughput stopped improving.
+
+    A step saturates when its goodput grows by less than ``min_gain`` over the
+    previous step or its error rate exceeds 1%. ``None`` means no knee was reached.
+    """
+    endpoints = {endpoint for _, summary in steps for endpoint in summary}
+    saturation: Dict[str, Optional[float]] = {}
+    for endpoint in sorted(endpoints):
+        saturation[endpoint] = None
+        previous: Optional[Tuple[float, float]] = None
+        for level, summary in steps:
+            stats = summary.get(endpoint)
+            if stats is None:
+                continue
+            throughput = stats["throughput_rps"]
+            if previous is not None and (
+                throughput < previous[1] * (1 + min_gain) or stats["error_rate"] > 0.01
+            ):
+                saturation[endpoint] = previous[0]
+                break
+            previous = (level, throughput)
+    return saturation
+
+
+def _print_summary(title: str, summary: Dict[str, dict]) -> None:
+    print(f"\n== {title} ==")
+    print(f"{'endpoint':<8} {'reqs':>6} {'rps':>8} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for endpoint in sorted(summary, key=lambda name: (name == "all", name)):
+        stats = summary[endpoint]
+        print(
+            f"{endpoint:<8} {stats['requests']:>6} {stats['throughput_rps']:>8.2f} "
+            f"{stats['error_rate'] * 100:>6.2f} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+            f"{stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f}"
+        )
+
+
+def _wait_for_health(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited early with code {process.returncode}.")
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not become healthy within {timeout:.0f}s.")
+
+
+def _stop(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+@contextmanager
+def running_stack(args: argparse.Namespace) -> Iterator[str]:
+    """Start the fake Ollama and the FastAPI app, yielding the app base URL.
+
+    Both run as subprocesses so the load generator's own CPU use cannot inflate the
+    fake Ollama's configured latency.
+    """
+    if args.base_url:
+        yield args.base_url.rstrip("/")
+        return
+
+    ollama_url = f"http://127.0.0.1:{args.ollama_port}"
+    ollama = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "backend.loadtest.fake_ollama",
+            "--port",
+            str(args.ollama_port),
+            "--latency-ms",
+            str(args.ollama_latency_ms),
+            "--jitter-ms",
+            str(args.ollama_jitter_ms),
+            "--failure-rate",
+            str(args.ollama_failure_rate),
+        ],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+    )
+    env = dict(os.environ)
+    env.update(
+        {
+            "OLLAMA_URL": ollama_url,
+            "DEEPFAKE_API_KEY": args.api_key,
+            "DEEPFAKE_STUB_MODEL": "0" if args.real_model else "1",
+            "DEEPFAKE_STUB_LATENCY_MS": str(args.stub_latency_ms),
+        }
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        _wait_for_health(f"{ollama_url}/api/tags", ollama, args.startup_timeout)
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "backend.app.main:app",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(args.port),
+                "--workers",
+                str(args.workers),
+                "--log-level",
+                "warning",
+            ],
+            cwd=REPO_ROOT,
+            env=env,
+        )
+        try:
+            _wait_for_health(f"{base_url}/health", process, args.startup_timeout)
+            yield base_url
+        finally:
+            _stop(process)
+    finally:
+        _stop(ollama)
+
+
+def _parse_mix(raw: str) -> Dict[str, float]:
+    mix = {}
+    for item in raw.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}'. Choose from {ENDPOINTS}.")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _parse_levels(raw: str) -> List[float]:
+    return [float(level) for level in raw.split(",") if level.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the deepfake backend end to end.")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=4, help="Closed-loop in-flight requests.")
+    load.add_argument("--rate", type=float, help="Open-loop request rate per second.")
+    parser.add_argument("--ramp", type=_parse_levels, help="Comma-separated concurrency (or rate) steps.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per run (without --ramp).")
+    parser.add_argument("--step-duration", type=float, default=15.0, help="Seconds per --ramp step.")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("image=6,frames=3,video=1"))
+    parser.add_argument("--frames-per-batch", type=int, default=8)
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument(
+        "--payload-pool",
+        type=int,
+        default=64,
+        help="Distinct pre-built bodies per endpoint; keep it above the peak in-flight requests.",
+    )
+    parser.add_argument(
+        "--duplicate-ratio",
+        type=float,
+        default=0.0,
+        help="Fraction of requests that resend a shared byte-identical body (exercises coalescing).",
+    )
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Open-loop worker cap.")
+    parser.add_argument("--base-url", help="Target an already running backend instead of starting one.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes.")
+    parser.add_argument("--api-key", default=os.getenv("DEEPFAKE_API_KEY", "local-demo-key"))
+    parser.add_argument("--real-model", action="store_true", help="Load the real .keras detectors.")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--ollama-port", type=int, default=11535)
+    parser.add_argument("--ollama-latency-ms", type=float, default=200.0)
+    parser.add_argument("--ollama-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--ollama-failure-rate", type=float, default=0.0)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this path.")
+    args = parser.parse_args(argv)
+    if not 0.0 <= args.duplicate_ratio <= 1.0:
+        parser.error("--duplicate-ratio must be between 0 and 1.")
+
+    if args.payload_pool < 1:
+        parser.error("--payload-pool must be at least 1.")
+
+    open_loop = args.rate is not None
+    levels = args.ramp or [args.rate if open_loop else args.concurrency]
+    peak_in_flight = args.max_in_flight if open_loop else int(max(levels))
+    if args.payload_pool < peak_in_flight:
+        print(
+            f"warning: --payload-pool {args.payload_pool} is below the peak of {peak_in_flight} in-flight "
+            "requests; repeated bodies may be coalesced by the backend.",
+            file=sys.stderr,
+        )
+    payloads = PayloadFactory(args.frames_per_batch, args.image_size, list(args.mix), args.payload_pool)
+    duration = args.step_duration if args.ramp else args.duration
+    unit = "rps" if open_loop else "concurrency"
+
+    steps: List[Tuple[float, Dict[str, dict]]] = []
+    with running_stack(args) as base_url:
+        driver = TrafficDriver(base_url, args.api_key, payloads, args.mix, args.duplicate_ratio)
+        for level in levels:
+            if open_loop:
+                samples, elapsed = driver.run_open_loop(level, duration, args.max_in_flight)
+            else:
+                samples, elapsed = driver.run_closed_loop(int(level), duration)
+            summary = summarize(samples, elapsed)
+            steps.append((level, summary))
+            _print_summary(f"{unit}={level:g} ({elapsed:.1f}s)", summary)
+
+    report = {
+        "mode": unit,
+        "mix": args.mix,
+        "duplicate_ratio": args.duplicate_ratio,
+        "steps": [{"level": level, "summary": summary} for level, summary in steps],
+    }
+    if len(steps) > 1:
+        report["saturation"] = find_saturation(steps)
+        print(f"\nSaturation point ({unit}, last level with >=5% goodput gain):")
+        for endpoint, level in report["saturation"].items():
+            print(f"  {endpoint:<8} {'not reached' if level is None else f'{level:g}'}")
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())